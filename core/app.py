@@ -1,6 +1,7 @@
 import streamlit as st
 import csv
 import os
+import run_profiler
 
 CSV_PATH = "group_convo.csv"
 ADMIN_FILE = "admin.txt"
@@ -72,14 +73,18 @@ else:
 # ----------------- Automation Buttons -----------------
 st.subheader("⚡ Run Automation Tasks")
 
+trace_mode = st.checkbox("🔬 Trace mode (profile + timeline in traces/)", value=run_profiler.trace_enabled())
+run_profiler.set_trace_enabled(trace_mode)
+
 col1, col2 = st.columns(2)
 col3, col4 = st.columns(2)
 
 with col1:
+    resume_scrape = st.checkbox("Resume any unfinished run from today", value=False)
     if st.button("🔄 Update Conversations"):
         try:
             from groupReader import update_csv
-            update_csv(CSV_PATH)
+            update_csv(CSV_PATH, resume=True if resume_scrape else None)
             st.success("✅ Conversations updated!")
         except Exception as e:
             st.error(f"❌ Failed: {e}")
@@ -0,0 +1,87 @@
+import os
+import sys
+from datetime import datetime, timedelta
+import storage
+
+# --------------------- Paths ---------------------
+BASE_PATH = os.path.dirname(sys.executable if getattr(sys, 'frozen', False) else __file__)
+HISTORY_PATH = os.path.join(BASE_PATH, "broadcast_history.json")
+
+INACTIVE_DAYS = 14             # skip groups with no messages for this many days
+CHECK_FRESH_DAYS = 2           # inactivity only counts if the group was read this recently
+EST_SECONDS_PER_GROUP = 6.0    # sleeps in search + send, used until a real timing exists
+
+
+# --------------------- History ---------------------
+def load_history(path=HISTORY_PATH):
+    return storage.load_json(path)
+
+def save_history(history, path=HISTORY_PATH):
+    storage.save_json(history, path)
+
+def _today():
+    return datetime.now().strftime("%Y-%m-%d")
+
+def record_activity(history, group_name, messages):
+    """Remember that the group had messages today (called by the group reader).
+
+    Only incoming messages count. Our own broadcasts and follow-ups are
+    outgoing, or a group we keep messaging would never look inactive.
+    """
+    entry = history.setdefault(group_name, {})
+    entry.setdefault("first_checked", _today())
+    entry["last_checked"] = _today()
+    if any(msg.get("incoming") for msg in messages):
+        entry["last_active"] = _today()
+
+def record_sent(history, group_name):
+    history.setdefault(group_name, {})["last_sent"] = _today()
+
+
+# --------------------- Planner ---------------------
+def plan_broadcast(groups, history, inactive_days=INACTIVE_DAYS, check_fresh_days=CHECK_FRESH_DAYS):
+    """Decide which groups get today's morning message.
+
+    Returns (plan, skipped): plan is the ordered list of groups to message,
+    skipped is a list of (group, reason).
+    """
+    today = _today()
+    cutoff = (datetime.now() - timedelta(days=inactive_days)).strftime("%Y-%m-%d")
+    fresh_cutoff = (datetime.now() - timedelta(days=check_fresh_days)).strftime("%Y-%m-%d")
+    plan, skipped, seen = [], [], set()
+
+    for group in groups:
+        group = group.strip()
+        if not group:
+            continue
+        if group in seen:
+            skipped.append((group, "duplicate"))
+            continue
+        seen.add(group)
+
+        entry = history.get(group, {})
+        if entry.get("last_sent") == today:
+            skipped.append((group, "already sent today"))
+            continue
+
+        # Groups we have not watched for a full window (e.g. newly added) or
+        # have not read recently (reader not run, reads failing) still get the
+        # message; only groups we know are silent are skipped.
+        last_active = entry.get("last_active") or entry.get("first_checked")
+        checked_recently = entry.get("last_checked", "") >= fresh_cutoff
+        if checked_recently and last_active and last_active < cutoff:
+            skipped.append((group, f"no messages since {last_active}"))
+            continue
+
+        plan.append(group)
+
+    # Recently active chats sit at the top of the sidebar, so open them first
+    plan.sort(key=lambda g: history.get(g, {}).get("last_active", ""), reverse=True)
+    return plan, skipped
+
+def report_skipped(skipped, seconds_per_group=EST_SECONDS_PER_GROUP):
+    for group, reason in skipped:
+        print(f"⏭️ Skipped {group}: {reason}")
+    saved = len(skipped) * seconds_per_group
+    print(f"📊 Skipped {len(skipped)} group(s), saved about {saved:.0f}s.")
+    return saved
@@ -4,6 +4,9 @@ from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 import groupReader
+import summary_state
+import storage
+import run_profiler
 from dotenv import load_dotenv
 
 # ------------------ Paths ------------------
@@ -19,16 +22,168 @@ HEADERS = {"Content-Type": "application/json", "api-key": AZURE_API_KEY}
 
 
 # --------------------- Use Azure LLM ---------------------
+MAX_REPAIR_ATTEMPTS = 1  # extra LLM calls allowed when the JSON reply does not validate
+FOLLOWUP_MAX_TOKENS = 500
+PLANS_MAX_TOKENS = 1200  # incremental replies carry plans as well as follow-ups
+TOKEN_LIMIT_CAP = 4000   # ceiling when retrying a reply that was cut off
+
+FOLLOWUP_ITEM_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string"},
+        "message": {"type": "string"}
+    },
+    "required": ["name", "message"],
+    "additionalProperties": False
+}
+
+PLAN_ITEM_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string"},
+        "plan": {"type": "string"}
+    },
+    "required": ["name", "plan"],
+    "additionalProperties": False
+}
+
+
+def evening_response_format(with_plans=False):
+    properties = {"followups": {"type": "array", "items": FOLLOWUP_ITEM_SCHEMA}}
+    if with_plans:
+        properties["plans"] = {"type": "array", "items": PLAN_ITEM_SCHEMA}
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "evening_updates",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": properties,
+                "required": list(properties),
+                "additionalProperties": False
+            }
+        }
+    }
+
+
+def call_llm(prompt, max_tokens=500, response_format=None, history=None):
+    messages = [
+        {"role": "system", "content": "You are a helpful assistant."},
+        {"role": "user", "content": prompt}
+    ]
+    if history:
+        messages.extend(history)
+
+    body = {
+        "messages": messages,
+        "temperature": 0.7,
+        "max_tokens": max_tokens
+    }
+    if response_format:
+        body["response_format"] = response_format
+
+    response = requests.post(AZURE_OPENAI_ENDPOINT, headers=HEADERS, json=body)
+    response.raise_for_status()
+    choice = response.json()["choices"][0]
+    return choice["message"]["content"].strip(), choice.get("finish_reason")
+
+
+# --------------------- Parse JSON Reply ---------------------
+def _strip_code_fence(raw_reply):
+    text = raw_reply.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        if text.rstrip().endswith("```"):
+            text = text.rstrip()[:-3]
+    return text.strip()
+
+
+def _validate_items(items, key, value_field, admin_name=""):
+    if not isinstance(items, list):
+        raise ValueError(f"'{key}' must be a list")
+
+    cleaned, seen = [], set()
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValueError(f"every '{key}' entry must be an object")
+        name = str(item.get("name", "")).strip()
+        value = " ".join(str(item.get(value_field, "")).split())  # one line per person
+        if not name or not value:
+            continue
+        if admin_name and name.lower() == admin_name.lower():
+            continue
+        if name.lower() in seen:
+            continue
+        seen.add(name.lower())
+        cleaned.append({"name": name, value_field: value})
+    return cleaned
+
+
+def parse_evening_reply(raw_reply, with_plans=False, admin_name=""):
+    """Parse and validate the JSON reply. Raises ValueError if it does not match the schema."""
+    try:
+        data = json.loads(_strip_code_fence(raw_reply))
+    except json.JSONDecodeError as e:
+        raise ValueError(f"reply is not valid JSON: {e}")
+    if not isinstance(data, dict):
+        raise ValueError("reply must be a JSON object")
+
+    result = {"followups": _validate_items(data.get("followups"), "followups", "message", admin_name)}
+    if with_plans:
+        result["plans"] = _validate_items(data.get("plans"), "plans", "plan")
+    return result
+
+
+def request_evening_json(prompt, group_name, with_plans=False, admin_name=""):
+    """Ask for a JSON reply, raising the token limit if it is cut off and repairing
+    it if it does not validate. Returns None on failure."""
+    response_format = evening_response_format(with_plans)
+    max_tokens = PLANS_MAX_TOKENS if with_plans else FOLLOWUP_MAX_TOKENS
+    history = []
+    repairs_left = MAX_REPAIR_ATTEMPTS
+
+    while True:
+        try:
+            raw_reply, finish_reason = call_llm(prompt, max_tokens, response_format, history)
+        except Exception as e:
+            print(f"❌ LLM generation failed: {e}")
+            return None
+
+        # A cut-off reply is not the model's fault, so ask again with more room
+        # instead of spending the repair round on it
+        if finish_reason == "length":
+            if max_tokens >= TOKEN_LIMIT_CAP:
+                print(f"❌ LLM reply for {group_name} still cut off at {max_tokens} tokens.")
+                return None
+            max_tokens = min(max_tokens * 2, TOKEN_LIMIT_CAP)
+            print(f"⚠️ LLM reply for {group_name} was cut off, retrying with {max_tokens} tokens.")
+            continue
+
+        try:
+            return parse_evening_reply(raw_reply, with_plans, admin_name)
+        except ValueError as e:
+            print(f"⚠️ Invalid JSON from LLM for {group_name}: {e}")
+            if repairs_left == 0:
+                return None
+            repairs_left -= 1
+            history = [
+                {"role": "assistant", "content": raw_reply},
+                {"role": "user", "content": f"That reply was invalid ({e}). Reply again with only the JSON object that matches the schema."}
+            ]
+
+
+def compose_evening_message(followups):
+    """Merge the follow-ups into one message so the group gets a single send."""
+    return "\n".join(f"{item['name']}: {item['message']}" for item in followups)
+
+
+# --------------------- Generate Follow-ups ---------------------
 def generate_evening_updates_llm(conversation, group_name):
     if not conversation:
         return []
 
-    try:
-        with open(ADMIN_FILE, "r", encoding="utf-8") as f:
-            admin_name = f.read().strip()
-    except FileNotFoundError:
-        admin_name = ""
-
+    admin_name = storage.load_admin_name(ADMIN_FILE)
     convo_text = "\n".join([f"{msg['sender']}: {msg['message']}" for msg in conversation])
 
     prompt = f"""
@@ -41,26 +196,50 @@ Rules:
 - Identify what each non-admin person planned to do in the morning.
 - Write a short, polite evening follow-up asking them for an update.
 - Skip admin "{admin_name}".
-- Format: <name>: <evening message>
+- Reply only with JSON: {{"followups": [{{"name": "<name>", "message": "<evening message>"}}]}}
 """
 
-    body = {
-        "messages": [
-            {"role": "system", "content": "You are a helpful assistant."},
-            {"role": "user", "content": prompt}
-        ],
-        "temperature": 0.7,
-        "max_tokens": 500
-    }
-
-    try:
-        response = requests.post(AZURE_OPENAI_ENDPOINT, headers=HEADERS, json=body)
-        response.raise_for_status()
-        raw_reply = response.json()["choices"][0]["message"]["content"].strip()
-        return [line for line in raw_reply.split("\n") if line.strip()]
-    except Exception as e:
-        print(f"❌ LLM generation failed: {e}")
+    result = request_evening_json(prompt, group_name, admin_name=admin_name)
+    if not result or not result["followups"]:
         return []
+    return [compose_evening_message(result["followups"])]
+
+
+def generate_evening_updates_incremental(new_messages, group_name, previous_plans):
+    """Update the stored plans with only the new messages.
+
+    Returns (messages, plans); plans is None when the LLM call failed so the
+    watermark is not moved past messages that were never covered.
+    """
+    if not new_messages:
+        return [], previous_plans
+
+    admin_name = storage.load_admin_name(ADMIN_FILE)
+    convo_text = "\n".join([f"{msg['sender']}: {msg['message']}" for msg in new_messages])
+
+    prompt = f"""
+You are a polite assistant preparing evening follow-up messages in a WhatsApp group called '{group_name}'.
+
+Here is what you already know about everyone's plans for today:
+{previous_plans or "(nothing yet)"}
+
+Here are the new messages since then:
+{convo_text}
+
+Rules:
+- Update the plans with anything new (new plans, progress, changes). Keep people from the old plans unless they are done.
+- Write a short, polite evening follow-up for each non-admin person who has a plan but has not given an update yet.
+- Skip admin "{admin_name}".
+- Reply only with JSON: {{"plans": [{{"name": "<name>", "plan": "<plan and status>"}}], "followups": [{{"name": "<name>", "message": "<evening message>"}}]}}
+"""
+
+    result = request_evening_json(prompt, group_name, with_plans=True, admin_name=admin_name)
+    if result is None:
+        return [], None
+
+    plans = "\n".join(f"{item['name']}: {item['plan']}" for item in result["plans"])
+    messages = [compose_evening_message(result["followups"])] if result["followups"] else []
+    return messages, plans
 
 
 # --------------------- Send Evening Message ---------------------
@@ -84,35 +263,67 @@ def send_evening_message(driver, group_name, messages):
             time.sleep(1)  # optional, avoid flooding
         
         print(f"✅ Evening messages sent to {group_name}")
+        return True
     except Exception as e:
         print(f"❌ Failed to send evening message to {group_name}: {e}")
+        return False
 
 
 
 
 # --------------------- Main Wrapper ---------------------
-def send_evening_messages(csv_path=CSV_PATH):
-    groupReader.update_csv()
+@run_profiler.profiled("send_evening_messages")
+def send_evening_messages(csv_path=CSV_PATH, incremental=None):
+    groupReader.update_csv(csv_path)
 
     if not os.path.exists(csv_path):
         print("⚠️ No group_convo.csv found, skipping evening messages.")
         return
 
+    if incremental is None:
+        incremental = summary_state.incremental_enabled()
+    state = summary_state.load_state() if incremental else {}
+
     with open(csv_path, mode="r", newline="", encoding="utf-8") as file:
         rows = list(csv.DictReader(file))
 
-    driver = groupReader.launch_driver()
-    groupReader.wait_for_page_load(driver)
+    with run_profiler.stage("launch"):
+        driver = groupReader.launch_driver()
+        groupReader.wait_for_page_load(driver)
 
     for row in rows:
         group_name = row["groupName"]
-        try:
-            conversation = json.loads(row["Conversation"]) if row["Conversation"].strip() else []
-        except json.JSONDecodeError:
-            conversation = []
+        with run_profiler.stage("group", group_name):
+            try:
+                conversation = json.loads(row["Conversation"]) if row["Conversation"].strip() else []
+            except json.JSONDecodeError:
+                conversation = []
+
+            if incremental:
+                entry = summary_state.get_group_state(state, "evening", group_name)
+                new_msgs = summary_state.split_new_messages(conversation, entry)
+                previous_plans = entry["summary"]
+                if new_msgs is None:
+                    print(f"ℹ️ Could not find where the last run stopped in {group_name}, rebuilding plans.")
+                    new_msgs, previous_plans = conversation, ""
+                if not new_msgs:
+                    print(f"⏭️ No new messages in {group_name} since last run, skipping.")
+                    continue
+                with run_profiler.stage("llm"):
+                    evening_msgs, plans = generate_evening_updates_incremental(new_msgs, group_name, previous_plans)
+            else:
+                with run_profiler.stage("llm"):
+                    evening_msgs = generate_evening_updates_llm(conversation, group_name)
+                plans = None
+
+            delivered = True
+            if evening_msgs:
+                with run_profiler.stage("send"):
+                    delivered = send_evening_message(driver, group_name, evening_msgs)
 
-        evening_msgs = generate_evening_updates_llm(conversation, group_name)
-        if evening_msgs:
-            send_evening_message(driver, group_name, evening_msgs)
+            # Only move the watermark once the follow-ups actually reached the group
+            if incremental and plans is not None and delivered:
+                summary_state.update_group_state(state, "evening", group_name, conversation, plans)
+                summary_state.save_state(state)
 
     driver.quit()
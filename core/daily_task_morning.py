@@ -1,4 +1,6 @@
 import csv, time, os
+import broadcast_planner
+import run_profiler
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
@@ -49,25 +51,46 @@ def send_message(driver, message):
 
 
 # ------------------ Main Task ------------------
-def send_morning_message():
-    driver = launch_driver()
-    wait_for_whatsapp(driver)
+MORNING_MESSAGE = "Good morning team! Please reply with what you plan to do today for your tasks."
 
+@run_profiler.profiled("send_morning_message")
+def send_morning_message():
     # ✅ Use BASE_PATH to ensure correct file location
     if not os.path.exists(CSV_PATH):
         print("No group_convo.csv found, nothing to send.")
-        driver.quit()
         return
 
     with open(CSV_PATH, "r", encoding="utf-8") as f:
         reader = csv.DictReader(f)
         groups = [row['groupName'] for row in reader]
 
-    morning_message = "Good morning team! Please reply with what you plan to do today for your tasks."
+    history = broadcast_planner.load_history()
+    plan, skipped = broadcast_planner.plan_broadcast(groups, history)
+    print(f"📋 Morning plan: {len(plan)} to send, {len(skipped)} skipped.")
 
-    for group in groups:
-        if group.strip():
-            search_and_open_group(driver, group)
-            send_message(driver, morning_message)
+    sent_times = []
+    if plan:
+        with run_profiler.stage("launch"):
+            driver = launch_driver()
+            wait_for_whatsapp(driver)
+
+        for group in plan:
+            start = time.time()
+            try:
+                with run_profiler.stage("group", group):
+                    with run_profiler.stage("open_group"):
+                        search_and_open_group(driver, group)
+                    with run_profiler.stage("send"):
+                        send_message(driver, MORNING_MESSAGE)
+            except Exception as e:
+                print(f"❌ Failed to send morning message to {group}: {e}")
+                continue
+            sent_times.append(time.time() - start)
+            broadcast_planner.record_sent(history, group)
+            broadcast_planner.save_history(history)  # so a crash never re-sends to this group today
+
+        driver.quit()
 
-    driver.quit()
+    # Use this run's real per-group time when we have one
+    per_group = sum(sent_times) / len(sent_times) if sent_times else broadcast_planner.EST_SECONDS_PER_GROUP
+    broadcast_planner.report_skipped(skipped, per_group)
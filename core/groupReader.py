@@ -5,11 +5,16 @@ import csv
 import json
 import platform
 from datetime import datetime
+import broadcast_planner
+import storage
+import run_profiler
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import WebDriverException
+import urllib3
 
 # --------------------- Paths ---------------------
 BASE_PATH = os.path.dirname(sys.executable if getattr(sys, 'frozen', False) else __file__)
@@ -17,6 +22,10 @@ PROFILE_PATH = os.path.join(BASE_PATH, "WhatsAppProfile")
 CSV_PATH = os.path.join(BASE_PATH, "group_convo.csv")
 os.makedirs(PROFILE_PATH, exist_ok=True)
 
+# What a dead Chrome/chromedriver raises: a WebDriver error when the session
+# is gone, or a plain connection error when chromedriver itself has died
+SESSION_ERRORS = (WebDriverException, urllib3.exceptions.HTTPError, ConnectionError)
+
 # --------------------- Launch WhatsApp ---------------------
 def launch_driver():
     options = webdriver.ChromeOptions()
@@ -32,6 +41,14 @@ def wait_for_page_load(driver, timeout=60):
     )
     print("✅ WhatsApp Web loaded.")
 
+def session_alive(driver):
+    # Any cheap command fails once Chrome or the driver session is gone
+    try:
+        driver.current_url
+        return True
+    except SESSION_ERRORS:
+        return False
+
 # --------------------- Open Group ---------------------
 def search_and_open_group(driver, group_name):
     time.sleep(1)
@@ -55,6 +72,9 @@ def read_todays_messages(driver, count=100):
     messages = messages[-count:]
     extracted = []
 
+    # One extra query per group gives the direction; element ids compare locally
+    incoming_ids = {elem.id for elem in driver.find_elements(By.XPATH, '//div[contains(@class,"message-in")]')}
+
     if platform.system() == "Windows":
         today = datetime.now().strftime("%#m/%#d/%Y")
     else:
@@ -70,7 +90,7 @@ def read_todays_messages(driver, count=100):
             message_elem = msg.find_element(By.XPATH, './/span[contains(@class,"selectable-text")]')
             message = message_elem.text.strip()
             if message:
-                extracted.append({"sender": sender, "message": message})
+                extracted.append({"sender": sender, "message": message, "incoming": msg.id in incoming_ids})
         except:
             continue
     return extracted
@@ -90,45 +110,147 @@ def send_message(driver, group_name, messages):
         time.sleep(1)
     print(f"✅ Message sent to {group_name}")
 
+# --------------------- Run Manifest ---------------------
+def manifest_path_for(csv_path):
+    return os.path.splitext(csv_path)[0] + "_run.json"
+
+def new_manifest(group_names):
+    return {
+        "date": datetime.now().strftime("%Y-%m-%d"),
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "complete": False,
+        "groups": {name: {"status": "pending"} for name in group_names}
+    }
+
+def load_resumable_manifest(manifest_path, group_names, max_age_minutes=None):
+    """Return today's unfinished manifest synced with the current group list, or None.
+
+    With max_age_minutes, only a run started within that window is returned.
+    """
+    manifest = storage.load_json(manifest_path)
+    if not manifest or manifest.get("complete") or manifest.get("date") != datetime.now().strftime("%Y-%m-%d"):
+        return None
+    if max_age_minutes is not None:
+        started = datetime.fromisoformat(manifest["started"])
+        if (datetime.now() - started).total_seconds() > max_age_minutes * 60:
+            print(f"ℹ️ Unfinished run from {manifest['started']} is older than {max_age_minutes} min, starting a fresh run. Use resume to continue it instead.")
+            return None
+
+    old_groups = manifest.get("groups", {})
+    manifest["groups"] = {name: old_groups.get(name, {"status": "pending"}) for name in group_names}
+    return manifest
+
+
 # --------------------- Update CSV ---------------------
-def update_csv():
-    updated_rows = []
+AUTO_RESUME_MINUTES = 60  # a crashed run this recent is continued, not restarted
+
+@run_profiler.profiled("update_csv")
+def update_csv(csv_path=CSV_PATH, resume=None):
+    """Fetch today's messages for every group into the CSV.
 
+    resume=None continues an unfinished run from the last AUTO_RESUME_MINUTES,
+    resume=True continues any unfinished run from today, resume=False always
+    starts over.
+    """
     # Ensure CSV exists
-    if not os.path.exists(CSV_PATH):
-        with open(CSV_PATH, "w", encoding="utf-8", newline="") as f:
+    if not os.path.exists(csv_path):
+        with open(csv_path, "w", encoding="utf-8", newline="") as f:
             writer = csv.DictWriter(f, fieldnames=["groupName", "Conversation"])
             writer.writeheader()
         return
 
     # Read existing groups
-    with open(CSV_PATH, mode='r', newline='', encoding='utf-8') as file:
+    with open(csv_path, mode='r', newline='', encoding='utf-8') as file:
         reader = csv.DictReader(file)
         rows = list(reader)
+    group_names = [row['groupName'] for row in rows]
+
+    # Each group's result is checkpointed here as soon as it is read, so a
+    # browser crash only loses the group in progress.
+    manifest_path = manifest_path_for(csv_path)
+    manifest = None
+    if resume is True:
+        manifest = load_resumable_manifest(manifest_path, group_names)
+        if manifest is None:
+            print("ℹ️ No unfinished run from today to resume, starting a fresh run.")
+    elif resume is None:
+        manifest = load_resumable_manifest(manifest_path, group_names, AUTO_RESUME_MINUTES)
+    if manifest is None:
+        manifest = new_manifest(group_names)
+    else:
+        print(f"🔁 Resuming unfinished run from {manifest['started']}.")
+    storage.save_json(manifest, manifest_path)
+
+    todo = [name for name in group_names if manifest["groups"][name]["status"] != "done"]
+    print(f"📋 {len(group_names) - len(todo)} group(s) already done, {len(todo)} to fetch.")
 
-    driver = launch_driver()
-    wait_for_page_load(driver)
+    history = broadcast_planner.load_history()
+    session_lost = False
 
-    for row in rows:
-        group_name = row['groupName']
-        print(f"\n📌 Fetching TODAY's messages from group: {group_name}")
-        todays_msgs = []
+    if todo:
+        with run_profiler.stage("launch"):
+            driver = launch_driver()
         try:
-            search_and_open_group(driver, group_name)
-            time.sleep(2)
-            todays_msgs = read_todays_messages(driver)
-        except Exception as e:
-            print(f"❌ Failed for group {group_name}: {e}")
+            with run_profiler.stage("launch"):
+                wait_for_page_load(driver)
 
-        row['Conversation'] = json.dumps(todays_msgs, ensure_ascii=False)
-        updated_rows.append(row)
+            for group_name in todo:
+                print(f"\n📌 Fetching TODAY's messages from group: {group_name}")
+                with run_profiler.stage("group", group_name):
+                    try:
+                        with run_profiler.stage("open_group"):
+                            search_and_open_group(driver, group_name)
+                            time.sleep(2)
+                        with run_profiler.stage("read_messages"):
+                            todays_msgs = read_todays_messages(driver)
+                        broadcast_planner.record_activity(history, group_name, todays_msgs)
+                        # The direction flag is only for activity tracking; keep the CSV format as before
+                        todays_msgs = [{"sender": m["sender"], "message": m["message"]} for m in todays_msgs]
+                        manifest["groups"][group_name] = {"status": "done", "conversation": todays_msgs}
+                    except Exception as e:
+                        if not session_alive(driver):
+                            # Leave this and the remaining groups pending for a resume
+                            print(f"❌ Browser session lost while fetching {group_name}: {e}")
+                            session_lost = True
+                            break
+                        print(f"❌ Failed for group {group_name}: {e}")
+                        manifest["groups"][group_name] = {"status": "failed", "error": str(e)}
 
-    driver.quit()
+                    with run_profiler.stage("checkpoint"):
+                        storage.save_json(manifest, manifest_path)
+                        broadcast_planner.save_history(history)
+        finally:
+            try:
+                driver.quit()
+            except SESSION_ERRORS:
+                pass  # the session is already gone
 
-    # Replace CSV completely
-    with open(CSV_PATH, mode='w', newline='', encoding='utf-8') as file:
+    # Replace CSV rows for fetched groups; failed groups get an empty
+    # conversation, groups never reached keep theirs until a resume fills them in
+    previous = {row['groupName']: row.get('Conversation', "[]") for row in rows}
+    updated_rows = []
+    for group_name in group_names:
+        entry = manifest["groups"][group_name]
+        if entry["status"] == "done":
+            conversation = json.dumps(entry.get("conversation", []), ensure_ascii=False)
+        elif entry["status"] == "failed":
+            conversation = "[]"
+        else:
+            conversation = previous[group_name]
+        updated_rows.append({"groupName": group_name, "Conversation": conversation})
+
+    with open(csv_path, mode='w', newline='', encoding='utf-8') as file:
         writer = csv.DictWriter(file, fieldnames=['groupName', 'Conversation'])
         writer.writeheader()
         writer.writerows(updated_rows)
 
-    print("\n✅ CSV replaced with only today's messages!")
\ No newline at end of file
+    unfinished = [name for name in group_names if manifest["groups"][name]["status"] != "done"]
+    manifest["complete"] = not unfinished
+    storage.save_json(manifest, manifest_path)
+
+    if session_lost:
+        print(f"\n⚠️ Browser session lost, {len(unfinished)} group(s) not fetched: {', '.join(unfinished)}. Run again with resume to continue.")
+    elif unfinished:
+        print(f"\n⚠️ CSV updated, but {len(unfinished)} group(s) failed: {', '.join(unfinished)}. Run again with resume to retry them.")
+    else:
+        print("\n✅ CSV replaced with only today's messages!")
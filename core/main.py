@@ -8,6 +8,7 @@ from groupReader import update_csv
 from daily_task_morning import send_morning_message
 from daily_task_evening import send_evening_messages
 from summarize_and_send import summarize_conversations_and_send
+import run_profiler
 
 
 # ----------------- Paths -----------------
@@ -118,7 +119,7 @@ ensure_files()  # make sure admin.txt + group_convo.csv exist
 
 root = tk.Tk()
 root.title("Algorizz Whatsapp Agent")
-root.geometry("500x500")
+root.geometry("500x570")
 
 # ----------- Admin Section -----------
 admin_name = load_admin()
@@ -145,6 +146,9 @@ tk.Label(root, text="Automation Tasks:", font=("Arial", 12)).pack(pady=10)
 btn1 = tk.Button(root, text="Run Group Reader", width=30, command=lambda: run_in_thread(update_csv))
 btn1.pack(pady=3)
 
+btn1_resume = tk.Button(root, text="Resume Group Reader", width=30, command=lambda: run_in_thread(lambda: update_csv(resume=True)))
+btn1_resume.pack(pady=3)
+
 btn2 = tk.Button(root, text="Run Daily Morning Message", width=30, command=lambda: run_in_thread(send_morning_message))
 btn2.pack(pady=3)
 
@@ -154,6 +158,10 @@ btn3.pack(pady=3)
 btn4 = tk.Button(root, text="Run Summarize & Send", width=30, command=lambda: run_in_thread(summarize_conversations_and_send))
 btn4.pack(pady=3)
 
+trace_var = tk.BooleanVar(value=run_profiler.trace_enabled())
+tk.Checkbutton(root, text="Trace mode (profile + timeline in traces/)", variable=trace_var,
+               command=lambda: run_profiler.set_trace_enabled(trace_var.get())).pack(pady=3)
+
 exit_btn = tk.Button(root, text="Exit", width=30, command=root.quit, bg="red", fg="white")
 exit_btn.pack(pady=20)
 
@@ -0,0 +1,225 @@
+import os
+import sys
+import time
+import json
+import cProfile
+import pstats
+import functools
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+# --------------------- Paths ---------------------
+BASE_PATH = os.path.dirname(sys.executable if getattr(sys, 'frozen', False) else __file__)
+TRACE_DIR = os.path.join(BASE_PATH, "traces")
+
+_enabled_override = None       # set by the Tkinter/Streamlit toggles
+_local = threading.local()     # active trace + stage stack for the running task
+_patch_lock = threading.Lock()
+_patch_count = 0
+_real_sleep = time.sleep
+_real_execute = None
+
+
+# --------------------- Mode ---------------------
+def trace_enabled():
+    # Turn on with TRACE_MODE=1 in .env, or from the runner UI
+    if _enabled_override is not None:
+        return _enabled_override
+    return os.getenv("TRACE_MODE", "0").strip().lower() in ("1", "true", "yes")
+
+def set_trace_enabled(flag):
+    global _enabled_override
+    _enabled_override = bool(flag)
+
+
+# --------------------- Trace Recording ---------------------
+class RunTrace:
+    """Collects Chrome-trace events and per-stage totals for one run."""
+
+    def __init__(self, label):
+        self.label = label
+        self.t0 = time.perf_counter()
+        self.events = []
+        self.stage_self = {}    # stage name -> time not spent in nested stages
+        self.group_totals = {}  # (task, group) -> wall time of that group's stage
+        self.lock = threading.Lock()
+
+    def add(self, name, category, start, end, args=None):
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": round((start - self.t0) * 1e6),
+            "dur": round((end - start) * 1e6),
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": args or {}
+        }
+        with self.lock:
+            self.events.append(event)
+
+    def add_stage_total(self, name, task, group, seconds, self_seconds):
+        with self.lock:
+            self.stage_self[name] = self.stage_self.get(name, 0.0) + self_seconds
+            if name == "group":
+                key = (task, group)
+                self.group_totals[key] = self.group_totals.get(key, 0.0) + seconds
+
+
+class _Frame:
+    def __init__(self, name, group, task):
+        self.name, self.group, self.task = name, group, task
+        self.child_seconds = 0.0
+
+
+def _current_labels():
+    stack = getattr(_local, "stack", None)
+    if not stack:
+        return {}
+    frame = stack[-1]
+    return {"task": frame.task, "stage": frame.name, "group": frame.group}
+
+@contextmanager
+def stage(name, group=None, is_task=False):
+    """Label everything inside (WebDriver commands, sleeps) with a stage and group."""
+    trace = getattr(_local, "trace", None)
+    if trace is None:
+        yield
+        return
+
+    stack = _local.stack
+    parent = stack[-1] if stack else None
+    if group is None and parent:
+        group = parent.group  # inherit the group of the enclosing stage
+    task = name if is_task or not parent else parent.task
+    frame = _Frame(name, group, task)
+    stack.append(frame)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        stack.pop()
+        seconds = end - start
+        if parent:
+            parent.child_seconds += seconds
+        trace.add(name, "stage", start, end, {"task": task, "group": group})
+        # Self-time only, so nested stages (e.g. update_csv inside the evening
+        # task) are not counted twice
+        trace.add_stage_total(name, task, group, seconds, seconds - frame.child_seconds)
+
+
+# --------------------- Patches ---------------------
+def _traced_sleep(seconds):
+    trace = getattr(_local, "trace", None)
+    if trace is None:
+        return _real_sleep(seconds)
+    start = time.perf_counter()
+    try:
+        return _real_sleep(seconds)
+    finally:
+        trace.add("sleep", "sleep", start, time.perf_counter(), dict(_current_labels(), seconds=seconds))
+
+def _traced_execute(self, driver_command, params=None):
+    trace = getattr(_local, "trace", None)
+    if trace is None:
+        return _real_execute(self, driver_command, params)
+    start = time.perf_counter()
+    try:
+        return _real_execute(self, driver_command, params)
+    finally:
+        trace.add(driver_command, "webdriver", start, time.perf_counter(), _current_labels())
+
+def _install_patches():
+    # Every WebDriver and WebElement call goes through WebDriver.execute
+    global _patch_count, _real_execute
+    from selenium.webdriver.remote.webdriver import WebDriver
+    with _patch_lock:
+        if _patch_count == 0:
+            _real_execute = WebDriver.execute
+            WebDriver.execute = _traced_execute
+            time.sleep = _traced_sleep
+        _patch_count += 1
+
+def _remove_patches():
+    global _patch_count
+    from selenium.webdriver.remote.webdriver import WebDriver
+    with _patch_lock:
+        _patch_count -= 1
+        if _patch_count == 0:
+            WebDriver.execute = _real_execute
+            time.sleep = _real_sleep
+
+
+# --------------------- Run Wrapper ---------------------
+def _write_outputs(trace, profiler):
+    os.makedirs(TRACE_DIR, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    base = os.path.join(TRACE_DIR, f"{trace.label}_{stamp}")
+
+    with open(base + ".trace.json", "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": trace.events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+    print(f"\n🔬 Timeline written: {base}.trace.json (open in chrome://tracing or Perfetto)")
+
+    if profiler is not None:
+        profiler.dump_stats(base + ".prof")
+        print(f"🔬 Profile written: {base}.prof")
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(15)
+
+def _print_slowest(trace, top=5):
+    groups = sorted(trace.group_totals.items(), key=lambda x: -x[1])
+    stages = sorted(((name, s) for name, s in trace.stage_self.items() if name != "group"), key=lambda x: -x[1])
+
+    print("🐢 Slowest groups:")
+    for (task, group), s in groups[:top]:
+        print(f"   {group} ({task}): {s:.1f}s")
+    print("🐢 Slowest stages (self time):")
+    for name, s in stages[:top]:
+        print(f"   {name}: {s:.1f}s")
+
+def run_traced(label, func, *args, **kwargs):
+    """Run func under cProfile and record a Chrome-trace timeline of the run."""
+    trace = RunTrace(label)
+    profiler = cProfile.Profile()
+    patched = False
+    try:
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # Python 3.12+ allows one profiler per process, so a second task
+            # started from the runner while one is traced gets a timeline only
+            print(f"⚠️ Profiler busy ({e}), recording {label} as a timeline only.")
+            profiler = None
+        _local.trace, _local.stack = trace, []
+        _install_patches()
+        patched = True
+        with stage(label, is_task=True):
+            return func(*args, **kwargs)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        if patched:
+            _remove_patches()
+        _local.trace, _local.stack = None, []
+        # Never let a reporting problem replace the task's own result or error
+        try:
+            _write_outputs(trace, profiler)
+            _print_slowest(trace)
+        except Exception as e:
+            print(f"⚠️ Could not write trace for {label}: {e}")
+
+def profiled(label):
+    """Decorator for task entry points: traces the run when trace mode is on."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if getattr(_local, "trace", None) is not None:
+                # Already inside a traced run (e.g. evening calls update_csv)
+                with stage(label, is_task=True):
+                    return func(*args, **kwargs)
+            if not trace_enabled():
+                return func(*args, **kwargs)
+            return run_traced(label, func, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,35 @@
+import os
+import sys
+import json
+
+# --------------------- Paths ---------------------
+BASE_PATH = os.path.dirname(sys.executable if getattr(sys, 'frozen', False) else __file__)
+ADMIN_FILE = os.path.join(BASE_PATH, "admin.txt")
+
+
+# --------------------- JSON Files ---------------------
+def load_json(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError) as e:
+        print(f"⚠️ Could not read {os.path.basename(path)}, starting fresh: {e}")
+        return {}
+
+def save_json(data, path):
+    # Write to a temp file first so a crash never leaves half a JSON file behind
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+# --------------------- Admin ---------------------
+def load_admin_name(admin_file=ADMIN_FILE):
+    try:
+        with open(admin_file, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return ""
@@ -4,6 +4,9 @@ import os
 import sys
 import time
 import requests
+import summary_state
+import storage
+import run_profiler
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
@@ -34,16 +37,13 @@ def resource_path(relative_path):
 ADMIN_FILE = os.path.join(BASE_PATH, "admin.txt")
 
 try:
-    with open(ADMIN_FILE, "r", encoding="utf-8") as f:
-        ADMIN_NAME = f.read().strip()
-        if not ADMIN_NAME:
-            raise ValueError("admin.txt is empty.")
-except FileNotFoundError:
-    print("❌ admin.txt not found. Please create the file and add the admin name.")
-    sys.exit(1)
+    ADMIN_NAME = storage.load_admin_name(ADMIN_FILE)
 except Exception as e:
     print(f"❌ Error reading admin.txt: {e}")
     sys.exit(1)
+if not ADMIN_NAME:
+    print("❌ admin.txt is missing or empty. Please create the file and add the admin name.")
+    sys.exit(1)
 
 # ------------------ Selenium Setup ------------------
 def launch_driver():
@@ -95,34 +95,21 @@ def send_message(driver, message):
     print("✅ Message sent.")
     time.sleep(2)
 
-# ------------------ Summarize & Send ------------------
-def summarize_conversations_and_send():
-    driver = launch_driver()
-    wait_for_whatsapp(driver)
-
-    csv_file = CSV_PATH
-    if not os.path.exists(csv_file):
-        print("⚠️ group_convo.csv not found. Exiting.")
-        driver.quit()
-        return
+# ------------------ Prompts ------------------
+SUMMARY_SECTIONS = """Your summary must include exactly three sections:
+1. Key things done → Brief bullet points on completed work or progress updates.
+2. Outstanding tasks & owners → Tasks that are pending, with the name of the person responsible.
+3. Bottlenecks & actions you need to take → Current challenges/blockers and the specific actions you should take.
 
-    with open(csv_file, "r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            group_name = row['groupName']
-            chat = row['Conversation']
+Keep it concise, factual, and easy to read. Do not add extra commentary or headings beyond these three sections. Don't use bold points and don't add numeric bullet points keep it simple."""
 
-            prompt_template = f"""
+def build_full_prompt(group_name, chat):
+    return f"""
 You are an executive assistant AI summarizing a WhatsApp group conversation for the admin.
 
 Read the conversation from the group "{group_name}" and summarize it into short, actionable bullet points.
 
-Your summary must include exactly three sections:
-1. Key things done → Brief bullet points on completed work or progress updates.
-2. Outstanding tasks & owners → Tasks that are pending, with the name of the person responsible.
-3. Bottlenecks & actions you need to take → Current challenges/blockers and the specific actions you should take.
-
-Keep it concise, factual, and easy to read. Do not add extra commentary or headings beyond these three sections. Don't use bold points and don't add numeric bullet points keep it simple.
+{SUMMARY_SECTIONS}
 
 Here is the group conversation:
 
@@ -131,26 +118,100 @@ Here is the group conversation:
 Now write the summary.
 """
 
-            payload = {
-                "messages": [
-                    {"role": "system", "content": "You are a helpful assistant."},
-                    {"role": "user", "content": prompt_template}
-                ],
-                "temperature": 0.7
-            }
-
-            response = requests.post(AZURE_OPENAI_ENDPOINT, headers=HEADERS, json=payload)
-
-            if response.status_code == 200:
-                summary = response.json()['choices'][0]['message']['content']
-                print(f"\nSummary for group: {group_name}\n{'-'*50}")
-                print(summary)
-
-                # Send summary to admin
-                search_and_open_chat(driver, ADMIN_NAME)
-                send_message(driver, f"*Update from group: {group_name}*\n\n{summary}")
-            else:
-                print(f"\n❌ Failed to summarize {group_name}. Status code: {response.status_code}")
-                print(response.text)
+def build_incremental_prompt(group_name, previous_summary, new_messages):
+    new_text = "\n".join(f"{msg['sender']}: {msg['message']}" for msg in new_messages)
+    return f"""
+You are an executive assistant AI keeping a running summary of a WhatsApp group conversation for the admin.
+
+Here is your previous summary of the group "{group_name}" for today:
+
+{previous_summary}
+
+Here are the new messages posted since that summary:
+
+{new_text}
+
+Update the summary with the new messages: move finished work to done, add new tasks and blockers, and drop anything that is no longer relevant.
+
+{SUMMARY_SECTIONS}
+
+Now write the updated summary.
+"""
+
+# ------------------ Summarize & Send ------------------
+@run_profiler.profiled("summarize_conversations_and_send")
+def summarize_conversations_and_send(incremental=None):
+    if incremental is None:
+        incremental = summary_state.incremental_enabled()
+    state = summary_state.load_state() if incremental else {}
+
+    with run_profiler.stage("launch"):
+        driver = launch_driver()
+        wait_for_whatsapp(driver)
+
+    csv_file = CSV_PATH
+    if not os.path.exists(csv_file):
+        print("⚠️ group_convo.csv not found. Exiting.")
+        driver.quit()
+        return
+
+    with open(csv_file, "r", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            group_name = row['groupName']
+            with run_profiler.stage("group", group_name):
+                chat = row['Conversation']
+
+                if incremental:
+                    try:
+                        conversation = json.loads(chat) if chat.strip() else []
+                    except json.JSONDecodeError:
+                        conversation = []
+                    entry = summary_state.get_group_state(state, "summary", group_name)
+                    new_msgs = summary_state.split_new_messages(conversation, entry)
+                    if new_msgs is None:
+                        print(f"ℹ️ Could not find where the last summary stopped in {group_name}, re-summarizing.")
+                    elif not new_msgs:
+                        print(f"⏭️ No new messages in {group_name} since last summary, skipping.")
+                        continue
+                    if new_msgs and entry["summary"]:
+                        prompt_template = build_incremental_prompt(group_name, entry["summary"], new_msgs)
+                    else:
+                        prompt_template = build_full_prompt(group_name, chat)
+                else:
+                    prompt_template = build_full_prompt(group_name, chat)
+
+                payload = {
+                    "messages": [
+                        {"role": "system", "content": "You are a helpful assistant."},
+                        {"role": "user", "content": prompt_template}
+                    ],
+                    "temperature": 0.7
+                }
+
+                with run_profiler.stage("llm"):
+                    response = requests.post(AZURE_OPENAI_ENDPOINT, headers=HEADERS, json=payload)
+
+                if response.status_code == 200:
+                    summary = response.json()['choices'][0]['message']['content']
+                    print(f"\nSummary for group: {group_name}\n{'-'*50}")
+                    print(summary)
+
+                    # Send summary to admin
+                    try:
+                        with run_profiler.stage("send"):
+                            search_and_open_chat(driver, ADMIN_NAME)
+                            send_message(driver, f"*Update from group: {group_name}*\n\n{summary}")
+                    except Exception as e:
+                        print(f"❌ Failed to send summary for {group_name} to admin: {e}")
+                        continue
+
+                    # Only move the watermark once the admin actually has the summary
+                    if incremental:
+                        summary_state.update_group_state(state, "summary", group_name, conversation, summary)
+                        summary_state.save_state(state)
+                else:
+                    print(f"\n❌ Failed to summarize {group_name}. Status code: {response.status_code}")
+                    print(response.text)
 
     driver.quit()
@@ -0,0 +1,73 @@
+import os
+import sys
+from datetime import datetime
+import storage
+
+# --------------------- Paths ---------------------
+BASE_PATH = os.path.dirname(sys.executable if getattr(sys, 'frozen', False) else __file__)
+STATE_PATH = os.path.join(BASE_PATH, "summary_state.json")
+
+TAIL_LENGTH = 5  # covered messages stored to find the watermark again
+
+
+# --------------------- Mode ---------------------
+def incremental_enabled():
+    # Turn on with INCREMENTAL_MODE=1 in .env (read lazily so load_dotenv has run)
+    return os.getenv("INCREMENTAL_MODE", "0").strip().lower() in ("1", "true", "yes")
+
+
+# --------------------- Load / Save ---------------------
+def load_state(path=STATE_PATH):
+    return storage.load_json(path)
+
+def save_state(state, path=STATE_PATH):
+    storage.save_json(state, path)
+
+
+# --------------------- Per-Group Entries ---------------------
+def _today():
+    return datetime.now().strftime("%Y-%m-%d")
+
+def get_group_state(state, task, group_name):
+    """Return {"summary", "watermark", "tail"} for today, or an empty entry."""
+    entry = state.get(task, {}).get(group_name)
+    if not entry or entry.get("date") != _today():
+        # group_convo.csv only holds today's messages, so yesterday's state is stale
+        return {"summary": "", "watermark": 0, "tail": []}
+    return entry
+
+def _tail_matches_at(conversation, tail, end):
+    return end >= len(tail) and end <= len(conversation) and conversation[end - len(tail):end] == tail
+
+def split_new_messages(conversation, entry):
+    """Return the messages in `conversation` that come after the stored watermark.
+
+    Returns None when the covered messages cannot be located unambiguously;
+    callers then fall back to a full re-summary instead of guessing.
+    """
+    watermark = entry.get("watermark", 0)
+    tail = entry.get("tail")
+    if not watermark:
+        return conversation
+    if not tail:
+        return None
+
+    # Fast path: the conversation still starts where it did last run
+    if _tail_matches_at(conversation, tail, watermark):
+        return conversation[watermark:]
+
+    # The reader only keeps the latest messages, so the prefix may have shifted.
+    # Short replies ("ok", "done") repeat, so match the whole covered tail and
+    # only trust a single match.
+    ends = [end for end in range(len(tail), len(conversation) + 1) if _tail_matches_at(conversation, tail, end)]
+    if len(ends) == 1:
+        return conversation[ends[0]:]
+    return None
+
+def update_group_state(state, task, group_name, conversation, summary):
+    state.setdefault(task, {})[group_name] = {
+        "date": _today(),
+        "summary": summary,
+        "watermark": len(conversation),
+        "tail": conversation[-TAIL_LENGTH:],
+    }